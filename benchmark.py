@@ -0,0 +1,119 @@
+import sys
+import argparse
+import contextlib
+import gc
+import io
+import multiprocessing
+import resource
+import time
+from tournament import load_agent_class, play_match
+from config import *
+
+def run_benchmark(blue_agent_class, red_agent_class, settings, matches, seed):
+    """Plays `matches` headless matches and returns a list of per-match results."""
+    results = []
+    for i in range(matches):
+        start = time.perf_counter()
+        # Agents tend to print when they die, which would dominate the timing
+        with contextlib.redirect_stdout(io.StringIO()):
+            world = play_match(blue_agent_class, red_agent_class, settings, seed=seed + i)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "seed": seed + i,
+            "ticks": world.tick,
+            "seconds": elapsed,
+            "ticks_per_second": world.tick / elapsed,
+            "observation_hit_rate": world.observation_cache.hit_rate,
+            "winner": world.win[0],
+            "reason": world.win[1],
+            "ticks_saved": world.ticks_saved,
+        })
+    return results
+
+def measure_match_memory(blue_team_folder, red_team_folder, settings, seed):
+    """
+    Plays one match and reports its memory use. Meant to run in a fresh process,
+    so the peak RSS belongs to this match alone.
+    """
+    blue_agent_class = load_agent_class(blue_team_folder)
+    red_agent_class = load_agent_class(red_team_folder)
+
+    gc.collect()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    collections_before = [generation["collections"] for generation in gc.get_stats()]
+    blocks_before = sys.getallocatedblocks()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        world = play_match(blue_agent_class, red_agent_class, settings, seed=seed)
+
+    collections = [generation["collections"] - before
+                   for generation, before in zip(gc.get_stats(), collections_before)]
+    return {
+        "seed": seed,
+        "ticks": world.tick,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "match_rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+        # Each young-generation collection follows ~700 net container allocations,
+        # so this count tracks allocation churn during the match.
+        "gc_collections": collections,
+        "live_blocks": sys.getallocatedblocks() - blocks_before,
+    }
+
+def run_memory_benchmark(blue_team_folder, red_team_folder, settings, matches, seed):
+    """Plays each match in its own process and returns a list of per-match memory reports."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for i in range(matches):
+        with context.Pool(1, maxtasksperchild=1) as pool:
+            results.append(pool.apply(measure_match_memory, (blue_team_folder, red_team_folder, settings, seed + i)))
+    return results
+
+def main(args):
+    try:
+        blue_agent_class = load_agent_class(args.blue_team_folder)
+        red_agent_class = load_agent_class(args.red_team_folder)
+    except (ImportError, AttributeError, FileNotFoundError) as e:
+        print(f"Error loading agent: {e}")
+        sys.exit(1)
+
+    settings = Settings(width=args.width, height=args.height, agents_per_team=args.agents_per_team,
+                        max_ticks=args.max_ticks, stalemate_agent_ticks=args.stalemate)
+    print(f"{settings.width}x{settings.height} map, {settings.agents_per_team} agents per team, "
+          f"up to {settings.max_ticks} ticks")
+
+    if args.memory:
+        results = run_memory_benchmark(args.blue_team_folder, args.red_team_folder, settings, args.matches, args.seed)
+        for result in results:
+            gen0, gen1, gen2 = result["gc_collections"]
+            print(f"seed {result['seed']:>4}: {result['ticks']:>6} ticks, peak RSS {result['peak_rss_mb']:7.1f} MB "
+                  f"(+{result['match_rss_mb']:.1f} MB during match), "
+                  f"gc collections {gen0}/{gen1}/{gen2}, {result['live_blocks']:+} live blocks")
+        return
+
+    results = run_benchmark(blue_agent_class, red_agent_class, settings, args.matches, args.seed)
+    for result in results:
+        print(f"seed {result['seed']:>4}: {result['ticks']:>6} ticks in {result['seconds']:7.2f}s "
+              f"({result['ticks_per_second']:8.1f} ticks/s, {result['observation_hit_rate']:4.0%} observations reused) "
+              f"- {result['winner']} ({result['reason']})"
+              + (f", {result['ticks_saved']} ticks saved" if result["ticks_saved"] else ""))
+
+    total_ticks = sum(result["ticks"] for result in results)
+    total_seconds = sum(result["seconds"] for result in results)
+    print(f"Overall: {total_ticks / total_seconds:.1f} ticks/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure headless simulation speed")
+    parser.add_argument("blue_team_folder", help="Path to the folder containing the blue team's agent.py")
+    parser.add_argument("red_team_folder", help="Path to the folder containing the red team's agent.py")
+    parser.add_argument("--width", type=int, default=256, help="World width in tiles")
+    parser.add_argument("--height", type=int, default=256, help="World height in tiles")
+    parser.add_argument("--agents-per-team", type=int, default=50, help="Number of agents on each team")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS, help="Tick limit for each match")
+    parser.add_argument("--stalemate", type=int, metavar="AGENT_TICKS", default=STALEMATE_AGENT_TICKS,
+                        help="End matches early on stalemate after this many agent ticks without anything new")
+    parser.add_argument("--matches", type=int, default=3, help="Number of matches to play")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first match")
+    parser.add_argument("--memory", "-M", action="store_true", help="Report per-match peak RSS and allocation counts instead of speed")
+    args = parser.parse_args()
+    main(args)
@@ -3,12 +3,14 @@ HEIGHT = 24
 WIDTH = 32
 TICK_RATE = 0.01  # Lower is faster
 MAX_TICKS = 6000  # Game ends in a tie after this many ticks
+STALEMATE_AGENT_TICKS = None # End the game in a tie once nothing new has happened for this many agent ticks (None to disable)
 
 # Update intervals (in ticks)
 AGENT_UPDATE_INTERVAL = 5
 BULLET_UPDATE_INTERVAL = 5
 
 # Agent settings
+AGENTS_PER_TEAM = 3
 AGENT_VISION_RANGE = 4
 SHOOT_COOLDOWN = 4 # Ticks an agent must wait before shooting
 AGENT_MAX_HP = 3
@@ -18,6 +20,11 @@ AGENT_MAX_AMMO = 10
 HEAL_RESUPPLY_RATE = 100 # Ticks between each heal/resupply tick
 HEAL_RESUPPLY_RANGE = 2 # Manhattan distance from flag spawn to heal/resupply
 
+# Team shared knowledge
+SHARED_KNOWLEDGE_LIMIT = 256 * 1024 * 1024 # Bytes a team may store; exceeding it forfeits the game (None for no limit)
+SHARED_KNOWLEDGE_SAMPLE_INTERVAL = 20 # Agent updates between estimates of its size
+SHARED_KNOWLEDGE_COPY_ON_WRITE = False # Use knowledge.CopyOnWriteKnowledge instead of a dict
+
 # Tile representations
 ASCII_TILES = {
     "empty": " ",
@@ -30,4 +37,62 @@ ASCII_TILES = {
     "red_flag": "}",
     "bullet": ".",
     "unknown": "/"
-}
\ No newline at end of file
+}
+
+class Settings:
+    """
+    Per-match game settings. Defaults come from the constants above, so
+    `Settings()` describes the standard game and individual matches can override
+    any of them, e.g. `Settings(width=256, height=256, agents_per_team=50)`.
+    """
+
+    FIELDS = (
+        "height", "width", "tick_rate", "max_ticks", "stalemate_agent_ticks",
+        "agent_update_interval", "bullet_update_interval",
+        "agents_per_team", "agent_vision_range", "shoot_cooldown",
+        "agent_max_hp", "agent_max_ammo",
+        "heal_resupply_rate", "heal_resupply_range",
+        "shared_knowledge_limit", "shared_knowledge_sample_interval", "shared_knowledge_copy_on_write",
+    )
+
+    def __init__(self, **overrides):
+        self.height = HEIGHT
+        self.width = WIDTH
+        self.tick_rate = TICK_RATE
+        self.max_ticks = MAX_TICKS
+        self.stalemate_agent_ticks = STALEMATE_AGENT_TICKS
+
+        self.agent_update_interval = AGENT_UPDATE_INTERVAL
+        self.bullet_update_interval = BULLET_UPDATE_INTERVAL
+
+        self.agents_per_team = AGENTS_PER_TEAM
+        self.agent_vision_range = AGENT_VISION_RANGE
+        self.shoot_cooldown = SHOOT_COOLDOWN
+        self.agent_max_hp = AGENT_MAX_HP
+        self.agent_max_ammo = AGENT_MAX_AMMO
+
+        self.heal_resupply_rate = HEAL_RESUPPLY_RATE
+        self.heal_resupply_range = HEAL_RESUPPLY_RANGE
+
+        self.shared_knowledge_limit = SHARED_KNOWLEDGE_LIMIT
+        self.shared_knowledge_sample_interval = SHARED_KNOWLEDGE_SAMPLE_INTERVAL
+        self.shared_knowledge_copy_on_write = SHARED_KNOWLEDGE_COPY_ON_WRITE
+
+        for name, value in overrides.items():
+            if name not in self.FIELDS:
+                raise TypeError(f"Unknown setting: {name}")
+            setattr(self, name, value)
+
+    def replace(self, **overrides):
+        """Returns a copy of these settings with some values changed."""
+        return Settings(**{**self.as_dict(), **overrides})
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={value!r}" for name, value in self.as_dict().items())
+        return f"Settings({values})"
+
+    def __eq__(self, other):
+        return isinstance(other, Settings) and self.as_dict() == other.as_dict()
@@ -0,0 +1,139 @@
+"""
+Determinism checks for engine changes.
+
+Record the per-tick state hashes of a set of seeded matches with one version of
+the engine, record them again with another, then compare the two recordings:
+
+    python determinism.py record my_team other_team --seeds 0:100 -o before.jsonl.gz
+    (change the engine)
+    python determinism.py record my_team other_team --seeds 0:100 -o after.jsonl.gz
+    python determinism.py compare before.jsonl.gz after.jsonl.gz
+
+Each line of a recording is one match: its seed, result and the state hash
+after generation and after every tick, as 16 hex digits per tick.
+"""
+
+import sys
+import argparse
+import contextlib
+import gzip
+import io
+import itertools
+import json
+from tournament import load_agent_class, play_match
+from config import *
+
+def parse_seeds(text):
+    """Parses '0:100' (a range) or '1,5,9' (a list) into a list of seeds."""
+    if ":" in text:
+        start, stop = text.split(":")
+        return list(range(int(start), int(stop)))
+    return [int(seed) for seed in text.split(",")]
+
+def record_match(blue_agent_class, red_agent_class, settings, seed, verify=False):
+    """Plays a match and returns its recording, a dict with the seed, result and hash stream."""
+    hashes = []
+
+    def on_tick(world):
+        state_hash = world.state_hash
+        if verify and state_hash != world.compute_state_hash():
+            raise AssertionError(f"Seed {seed}: incremental hash is out of date at tick {world.tick}")
+        hashes.append(f"{state_hash:016x}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        world = play_match(blue_agent_class, red_agent_class, settings, seed=seed, on_tick=on_tick)
+    return {
+        "seed": seed,
+        "winner": world.win[0],
+        "reason": world.win[1],
+        "ticks": world.tick,
+        "hashes": "".join(hashes),
+    }
+
+def read_recording(path):
+    """Yields the matches of a recording one at a time."""
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            yield json.loads(line)
+
+def first_divergence(hashes_a, hashes_b):
+    """Returns the first tick at which two hash streams differ, or None if they are identical."""
+    for offset in range(0, min(len(hashes_a), len(hashes_b)), 16):
+        if hashes_a[offset:offset+16] != hashes_b[offset:offset+16]:
+            return offset // 16
+    if len(hashes_a) != len(hashes_b):
+        return min(len(hashes_a), len(hashes_b)) // 16
+    return None
+
+def compare_recordings(path_a, path_b):
+    """
+    Compares two recordings match by match. Returns a list of (seed, tick, match a,
+    match b) divergences. A match only one of the recordings has diverges at tick 0,
+    with None for the missing side.
+    """
+    divergences = []
+    for match_a, match_b in itertools.zip_longest(read_recording(path_a), read_recording(path_b)):
+        if match_a is None or match_b is None:
+            match = match_a or match_b
+            divergences.append((match["seed"], 0, match_a, match_b))
+            continue
+        if match_a["seed"] != match_b["seed"]:
+            raise ValueError(f"Recordings cover different seeds ({match_a['seed']} vs {match_b['seed']})")
+        tick = first_divergence(match_a["hashes"], match_b["hashes"])
+        if tick is not None:
+            divergences.append((match_a["seed"], tick, match_a, match_b))
+    return divergences
+
+def record(args):
+    try:
+        blue_agent_class = load_agent_class(args.blue_team_folder)
+        red_agent_class = load_agent_class(args.red_team_folder)
+    except (ImportError, AttributeError, FileNotFoundError) as e:
+        print(f"Error loading agent: {e}")
+        sys.exit(1)
+
+    settings = Settings(width=args.width, height=args.height, agents_per_team=args.agents_per_team)
+    seeds = parse_seeds(args.seeds)
+    with gzip.open(args.output, "wt") as f:
+        for seed in seeds:
+            match = record_match(blue_agent_class, red_agent_class, settings, seed, verify=args.verify)
+            f.write(json.dumps(match) + "\n")
+    print(f"Recorded {len(seeds)} matches to {args.output}")
+
+def compare(args):
+    divergences = compare_recordings(args.recording_a, args.recording_b)
+    if not divergences:
+        print("All matches are identical.")
+        return
+    for seed, tick, match_a, match_b in divergences:
+        if match_a is None or match_b is None:
+            print(f"seed {seed}: only in recording {'a' if match_b is None else 'b'}")
+            continue
+        print(f"seed {seed}: diverges at tick {tick} "
+              f"(a: {match_a['winner']}/{match_a['reason']} after {match_a['ticks']} ticks, "
+              f"b: {match_b['winner']}/{match_b['reason']} after {match_b['ticks']} ticks)")
+    print(f"{len(divergences)} matches diverged.")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and compare per-tick state hashes of seeded matches")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Play seeded matches and record their hash streams")
+    record_parser.add_argument("blue_team_folder", help="Path to the folder containing the blue team's agent.py")
+    record_parser.add_argument("red_team_folder", help="Path to the folder containing the red team's agent.py")
+    record_parser.add_argument("--seeds", default="0:20", help="Seed range 'start:stop' or list '1,2,3'")
+    record_parser.add_argument("--output", "-o", required=True, help="Recording file to write (gzipped JSON lines)")
+    record_parser.add_argument("--width", type=int, default=WIDTH, help="World width in tiles")
+    record_parser.add_argument("--height", type=int, default=HEIGHT, help="World height in tiles")
+    record_parser.add_argument("--agents-per-team", type=int, default=AGENTS_PER_TEAM, help="Number of agents on each team")
+    record_parser.add_argument("--verify", action="store_true", help="Also check the incremental hash against a full rehash every tick")
+    record_parser.set_defaults(handler=record)
+
+    compare_parser = subparsers.add_parser("compare", help="Report the first diverging tick between two recordings")
+    compare_parser.add_argument("recording_a")
+    compare_parser.add_argument("recording_b")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
@@ -25,9 +25,11 @@ except ImportError:
 
 class Agent:
     
-    def __init__(self, color, index):
+    def __init__(self, color, index, settings=None):
         self.color = color
         self.index = index
+        # Match settings (map size, agents per team, vision range, ...)
+        self.settings = settings or Settings()
         
         # Agent with index 0 is designated as the player.
         self.is_player_controlled = (self.index == 0)
@@ -87,7 +89,7 @@ class Agent:
             preferred_direction = self.attack_direction
 
         # AI prioritizes survival: if low on health or ammo, it retreats
-        if hp < AGENT_MAX_HP / 2 or ammo == 0:
+        if hp < self.settings.agent_max_hp / 2 or ammo == 0:
             action = "move"
             preferred_direction = self.return_direction
         else:
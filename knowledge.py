@@ -0,0 +1,213 @@
+"""
+Team shared knowledge: measuring its memory footprint, and a copy-on-write
+variant for snapshotting and branching games.
+"""
+
+import sys
+import copy
+import types
+from collections.abc import MutableMapping
+
+# Values of these types can't be modified in place, so they never need copying
+_IMMUTABLE_TYPES = (int, float, complex, str, bytes, bool, type(None), frozenset, range)
+
+# Objects reachable from shared knowledge that are code, not data, and aren't counted
+_OPAQUE_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def measure_size(obj, limit=None):
+    """
+    Approximate memory footprint of an object and everything reachable from it
+    through containers and instance attributes, in bytes. Objects reachable
+    several times are counted once. With a `limit`, stops as soon as the
+    footprint is known to exceed it.
+    """
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _OPAQUE_TYPES):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if limit is not None and total > limit:
+            break
+        stack.extend(_references(obj))
+    return total
+
+
+def estimate_size(obj, rng, samples=32):
+    """
+    Estimate of `measure_size(obj)` that looks at no more than `samples` items
+    of each container. Larger containers are measured through a random sample
+    of their items, drawn with the `random.Random` instance `rng`, scaled up.
+    The cost depends on how deeply the data is nested, not on how much of it
+    there is.
+    """
+    seen = set()
+    total = 0.0
+    stack = [(obj, 1.0)]
+    while stack:
+        obj, weight = stack.pop()
+        if id(obj) in seen or isinstance(obj, _OPAQUE_TYPES):
+            continue
+        seen.add(id(obj))
+        total += weight * sys.getsizeof(obj)
+
+        references = _references(obj)
+        if len(references) > samples:
+            weight *= len(references) / samples
+            references = rng.sample(references, samples)
+        stack.extend((reference, weight) for reference in references)
+    return int(total)
+
+
+def _references(obj):
+    """The objects `obj` refers to that count towards its size."""
+    if isinstance(obj, dict):
+        return [*obj.keys(), *obj.values()]
+    if isinstance(obj, (list, tuple)):
+        return obj
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (CopyOnWriteKnowledge, _Layer)):
+        return (obj._local, obj._deleted, obj._base)
+    if isinstance(obj, _IMMUTABLE_TYPES):
+        return ()
+    references = []
+    if hasattr(obj, "__dict__"):
+        references.append(obj.__dict__)
+    for slot in getattr(type(obj), "__slots__", ()):
+        if hasattr(obj, slot):
+            references.append(getattr(obj, slot))
+    return references
+
+
+def _is_immutable(value):
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return True
+    if isinstance(value, tuple):
+        return all(_is_immutable(item) for item in value)
+    return False
+
+
+class _Layer:
+    """A frozen set of changes, shared by all branches forked from it."""
+
+    __slots__ = ("_local", "_deleted", "_base")
+
+    def __init__(self, local, deleted, base):
+        self._local = local
+        self._deleted = deleted
+        self._base = base
+
+
+class CopyOnWriteKnowledge(MutableMapping):
+    """
+    A dictionary that can be forked in constant time.
+
+    `fork()` freezes the current contents into a layer shared by this knowledge
+    base and the returned branch. Each branch keeps its own changes on top.
+    Reading a mutable value (a list, a dict, ...) that lives in a shared layer
+    copies that value into the branch first. So branches can modify what they
+    read without affecting each other, and only the values a branch actually
+    uses get copied. `copy.deepcopy` forks instead of copying everything, so
+    deep-copying a world for a snapshot doesn't copy its teams' knowledge.
+
+    Unlike with a plain dict, references to mutable values don't stay valid
+    across a fork. A value obtained before the fork is the object that now lives
+    in the shared layer. Modifying it changes what every branch sees, and the
+    next read of its key returns a copy that doesn't follow those changes.
+    Code using this class must read values again after any fork (for agents,
+    in every update) instead of keeping references to them.
+    """
+
+    def __init__(self, data=None, _base=None):
+        self._local = dict(data) if data else {}
+        self._deleted = set()
+        self._base = _base
+
+    def _lookup_base(self, key):
+        layer = self._base
+        while layer is not None:
+            if key in layer._local:
+                return layer._local[key]
+            if key in layer._deleted:
+                break
+            layer = layer._base
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        if key in self._local:
+            return self._local[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        value = self._lookup_base(key)
+        if not _is_immutable(value):
+            value = copy.deepcopy(value)
+            self._local[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._local[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key in self._local:
+            del self._local[key]
+            if self._in_base(key):
+                self._deleted.add(key)
+        elif key not in self._deleted and self._in_base(key):
+            self._deleted.add(key)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._local:
+            return True
+        return key not in self._deleted and self._in_base(key)
+
+    def _in_base(self, key):
+        try:
+            self._lookup_base(key)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        yielded = set()
+        for key in self._local:
+            yielded.add(key)
+            yield key
+        hidden = set(self._deleted)
+        layer = self._base
+        while layer is not None:
+            for key in layer._local:
+                if key not in yielded and key not in hidden:
+                    yielded.add(key)
+                    yield key
+            hidden |= layer._deleted
+            layer = layer._base
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"CopyOnWriteKnowledge({dict(self.items())!r})"
+
+    def fork(self):
+        """
+        Returns a branch with the same contents. Later changes to either, made
+        through values read after the fork, don't affect the other.
+        """
+        if self._local or self._deleted:
+            self._base = _Layer(self._local, self._deleted, self._base)
+            self._local, self._deleted = {}, set()
+        return CopyOnWriteKnowledge(_base=self._base)
+
+    def __copy__(self):
+        return self.fork()
+
+    def __deepcopy__(self, memo):
+        return self.fork()
@@ -1,9 +1,9 @@
 import sys
 import argparse
-import importlib
-import os
 import pygame
-from tournament import World
+from tournament import World, load_agent_class
+from spectator import SpectatorServer, parse_address
+from telemetry import MatchTelemetry
 from config import *
 
 def log_match_result(blue_agent_name, red_agent_name, winner, reason):
@@ -54,29 +54,6 @@ def render_world(world, screen, sprite_group, sprites):
     sprite_group.draw(screen)
     pygame.display.flip()
 
-def load_agent_class(folder_path):
-    """Dynamically loads the Agent class from the 'agent.py' file within a given folder."""
-    if not os.path.isdir(folder_path):
-        raise FileNotFoundError(f"Agent folder not found: {folder_path}")
-    
-    main_agent_file = os.path.join(folder_path, 'agent.py')
-    if not os.path.isfile(main_agent_file):
-        raise FileNotFoundError(f"Required 'agent.py' not found in folder: {folder_path}")
-
-    # Temporarily add folder to Python path to handle local imports within the agent code
-    sys.path.insert(0, os.path.abspath(folder_path))
-    try:
-        # The module name is 'agent' because the file is agent.py
-        agent_module = importlib.import_module('agent')
-        # Ensure the module is fresh if it was loaded before
-        importlib.reload(agent_module) 
-        agent_class = agent_module.Agent
-    finally:
-        # Clean up the path
-        sys.path.pop(0)
-    
-    return agent_class
-
 def main(args):
     # Dynamically import agent classes from folders
     try:
@@ -86,28 +63,42 @@ def main(args):
         print(f"Error loading agent: {e}")
         sys.exit(1)
 
+    settings = Settings(width=args.width, height=args.height, agents_per_team=args.agents_per_team,
+                        stalemate_agent_ticks=args.stalemate)
+    if args.knowledge_limit is not None:
+        settings.shared_knowledge_limit = args.knowledge_limit * 1024 * 1024 if args.knowledge_limit > 0 else None
+
     # Pygame setup for graphical mode
     if not args.headless:
         pygame.init()
-        screen = pygame.display.set_mode((WIDTH*32, HEIGHT*32))
+        screen = pygame.display.set_mode((settings.width*32, settings.height*32))
         sprite_group = pygame.sprite.Group()
         sprites = setup_sprites()
         running = True
     
+    # Spectator server for watching the match live from another machine
+    spectator_server = None
+    if args.spectate:
+        host, port = parse_address(args.spectate)
+        spectator_server = SpectatorServer(host, port)
+        spectator_server.start()
+        print(f"Spectator server listening on {host}:{port}")
+
+    # Game event recording for later analysis
+    telemetry = None
+    if args.telemetry:
+        telemetry = MatchTelemetry(args.telemetry, blue_team=args.blue_team_folder, red_team=args.red_team_folder)
+
     # World setup
-    world = World(HEIGHT, WIDTH, TICK_RATE, blue_agent_class, red_agent_class, headless=args.headless, ascii_mode=args.ascii)
+    world = World(settings.height, settings.width, settings.tick_rate, blue_agent_class, red_agent_class,
+                  headless=args.headless, ascii_mode=args.ascii, settings=settings, telemetry=telemetry)
     world.generate_world()
 
     while not world.win:
-        world.check_win_state()
-        world.buffer_worldmap()
+        world.step()
 
-        if world.tick % AGENT_UPDATE_INTERVAL == 0:
-            world.update_agents()
-        if (world.tick + 1) % BULLET_UPDATE_INTERVAL == 0:
-            world.update_bullets()
-            
-        world.iter()
+        if spectator_server:
+            spectator_server.publish(world)
 
         if args.ascii:
             world.ascii_display()
@@ -119,13 +110,28 @@ def main(args):
                 break
     
     world.terminate_agents()
+
+    if telemetry:
+        telemetry.close()
+
+    if spectator_server:
+        spectator_server.finish(world)
+        spectator_server.stop()
     
     winner, reason = world.win
     if winner == "tied":
         print(f"\nTied! Reason: {reason}\n")
+        if reason == "stalemate":
+            print(f"Stalemate ({world.stalemate_detector.cause}) ended the game {world.ticks_saved} ticks early.\n")
     else:
         print(f"\n{winner.capitalize()} won! Reason: {reason}\n")
     
+    if settings.shared_knowledge_sample_interval:
+        peak = world.shared_knowledge_peak
+        print(f"Shared knowledge peak: blue {peak['blue'] / 1024:.1f} KB, red {peak['red'] / 1024:.1f} KB")
+    for color in world.shared_knowledge_over_limit:
+        print(f"Warning: {color}'s shared knowledge was over the limit at the end of the game.")
+    
     log_match_result(args.blue_team_folder, args.red_team_folder, winner, reason)
     
     if not args.headless:
@@ -138,5 +144,13 @@ if __name__ == "__main__":
     parser.add_argument("red_team_folder", help="Path to the folder containing the red team's agent.py")
     parser.add_argument("--headless", "-H", action="store_true", help="Run simulation without GUI for faster execution")
     parser.add_argument("--ascii", "-A", action="store_true", help="Display ASCII rendering in the console")
+    parser.add_argument("--spectate", "-S", metavar="[HOST:]PORT", help="Stream the match to spectators (see spectator_client.py)")
+    parser.add_argument("--width", type=int, default=WIDTH, help="World width in tiles")
+    parser.add_argument("--height", type=int, default=HEIGHT, help="World height in tiles")
+    parser.add_argument("--agents-per-team", type=int, default=AGENTS_PER_TEAM, help="Number of agents on each team")
+    parser.add_argument("--telemetry", "-T", metavar="PATH", help="Append the match's game events to a .jsonl.gz file (see telemetry.py)")
+    parser.add_argument("--knowledge-limit", type=float, metavar="MB", help="Shared knowledge limit per team in MB (0 for no limit)")
+    parser.add_argument("--stalemate", type=int, metavar="AGENT_TICKS", default=STALEMATE_AGENT_TICKS,
+                        help="End the game in a tie when nothing new happens for this many agent ticks, or no team can win")
     args = parser.parse_args()
     main(args)
\ No newline at end of file
@@ -15,9 +15,11 @@ import random
 
 class Agent:
     
-    def __init__(self, color, index):
+    def __init__(self, color, index, settings=None):
         self.color = color
         self.index = index
+        # Match settings (map size, agents per team, vision range, ...)
+        self.settings = settings or Settings()
         
         # --- Universal Agent Logic Setup ---
         # Set team-specific goals and identifiers based on the agent's color.
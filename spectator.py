@@ -0,0 +1,238 @@
+"""
+Live spectator streaming for (headless) matches.
+
+The simulation publishes its `worldmap_buffer` after every tick. Spectators
+connect over TCP and receive newline-delimited JSON messages:
+
+    {"type": "init",  "tick": t, "width": w, "height": h, "map": [row, ...]}
+    {"type": "delta", "tick": t, "cells": [[x, y, tile], ...]}
+    {"type": "end",   "tick": t, "winner": "...", "reason": "..."}
+
+`init` carries the full map (each row joined into a string) and is sent once,
+when the spectator connects. Every following `delta` lists only the cells that
+changed since the previous message sent to that spectator. Spectators answer
+every message they have applied with a line of their own (`{"type": "ack"}`).
+
+The server runs its own asyncio event loop in a background thread, so the
+simulation never waits on the network. A spectator that can't keep up does not
+slow the match down, and doesn't fall behind either: while it has
+`MAX_IN_FLIGHT` messages unacknowledged, or more than `MAX_BUFFERED_BYTES`
+still waiting to be sent, new deltas are held back and merged together, so it
+simply skips the intermediate frames. When nobody is connected, publishing a
+tick only stores a reference to the current buffer.
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+# Limits on what a spectator may have on its way before further deltas are held back
+MAX_IN_FLIGHT = 8
+MAX_BUFFERED_BYTES = 64 * 1024
+
+
+class _Spectator:
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = {}    # (x, y) -> tile, deltas merged since the last send
+        self.tick = 0
+        self.end = None      # Final message, set once the match is over
+        self.in_flight = 0   # Messages sent but not acknowledged yet
+        self.wakeup = asyncio.Event()
+
+
+class SpectatorServer:
+
+    def __init__(self, host="127.0.0.1", port=8765):
+        self.host = host
+        self.port = port
+
+        self.width = 0
+        self.height = 0
+        self.tick = 0
+        self._buffer = None
+        self._end_message = None
+
+        self._spectators = set()
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def start(self):
+        """Starts the server loop in a background thread and waits until it is listening."""
+        self._thread = threading.Thread(target=self._run, name="spectator-server", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._server is None:
+            raise OSError(f"Could not start spectator server on {self.host}:{self.port}")
+
+    def stop(self, timeout=1.0):
+        """Gives spectators up to `timeout` seconds to receive the result, then stops the server loop."""
+        if self._loop is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._spectators and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+    def publish(self, world):
+        """Called from the simulation thread after each tick."""
+        previous = self._buffer
+        self.width, self.height, self.tick = world.width, world.height, world.tick
+        # The world creates a fresh buffer every tick, so keeping a reference is enough.
+        self._buffer = world.worldmap_buffer
+
+        # Spectators are registered before they read the buffer, so a spectator
+        # that is missed here already received the current buffer in its `init`.
+        if not self._spectators or previous is None:
+            return
+        cells = _diff(previous, self._buffer)
+        if cells:
+            self._loop.call_soon_threadsafe(self._broadcast, self.tick, cells)
+
+    def finish(self, world):
+        """Sends the match result to all spectators."""
+        winner, reason = world.win
+        self._end_message = {"type": "end", "tick": world.tick, "winner": winner, "reason": reason}
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._broadcast_end, self._end_message)
+
+    @property
+    def spectator_count(self):
+        return len(self._spectators)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle_spectator, self.host, self.port)
+            )
+        except OSError:
+            self._ready.set()
+            self._loop.close()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            # Stop serving spectators that haven't finished, and let their tasks clean up
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    def _broadcast(self, tick, cells):
+        for spectator in self._spectators:
+            spectator.pending.update(cells)
+            spectator.tick = tick
+            spectator.wakeup.set()
+
+    def _broadcast_end(self, message):
+        for spectator in self._spectators:
+            spectator.end = message
+            spectator.wakeup.set()
+
+    async def _handle_spectator(self, reader, writer):
+        spectator = _Spectator(writer)
+        self._spectators.add(spectator)
+        acks = asyncio.ensure_future(self._read_acks(reader, spectator))
+        try:
+            while self._buffer is None:
+                await asyncio.sleep(0.05)
+            buffer = self._buffer
+            spectator.in_flight += 1
+            await _send(writer, {
+                "type": "init",
+                "tick": self.tick,
+                "width": self.width,
+                "height": self.height,
+                "map": ["".join(row) for row in buffer],
+            })
+            if self._end_message:
+                spectator.end = self._end_message
+
+            while True:
+                if not spectator.pending and spectator.end is None:
+                    await spectator.wakeup.wait()
+                spectator.wakeup.clear()
+
+                if spectator.pending and (spectator.in_flight >= MAX_IN_FLIGHT
+                                          or writer.transport.get_write_buffer_size() > MAX_BUFFERED_BYTES):
+                    # Still busy with earlier frames: keep merging until the spectator catches up
+                    await asyncio.sleep(0.01)
+                    continue
+                if spectator.pending:
+                    spectator.in_flight += 1
+                    await _send(writer, _take_delta(spectator))
+                if spectator.end is not None and not spectator.pending:
+                    if spectator.in_flight:
+                        # Send the result last, once everything before it has arrived
+                        await asyncio.sleep(0.01)
+                        continue
+                    end, spectator.end = spectator.end, None
+                    await _send(writer, end)
+                    break
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # The server is stopping: hand over what's left, without waiting for the spectator
+            if spectator.end is not None:
+                if spectator.pending:
+                    _write(writer, _take_delta(spectator))
+                _write(writer, spectator.end)
+        finally:
+            acks.cancel()
+            self._spectators.discard(spectator)
+            writer.close()
+
+    async def _read_acks(self, reader, spectator):
+        try:
+            while await reader.readline():
+                spectator.in_flight -= 1
+        except ConnectionError:
+            pass
+
+
+def _diff(previous, current):
+    """Returns a dict of (x, y) -> tile for every cell that differs between two buffers."""
+    cells = {}
+    for y, (old_row, new_row) in enumerate(zip(previous, current)):
+        if old_row == new_row:
+            continue
+        for x, (old_tile, new_tile) in enumerate(zip(old_row, new_row)):
+            if old_tile != new_tile:
+                cells[(x, y)] = new_tile
+    return cells
+
+
+def _take_delta(spectator):
+    """Builds a delta message from the spectator's pending cells and clears them."""
+    cells, spectator.pending = spectator.pending, {}
+    return {
+        "type": "delta",
+        "tick": spectator.tick,
+        "cells": [[x, y, tile] for (x, y), tile in cells.items()],
+    }
+
+
+def _write(writer, message):
+    writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+async def _send(writer, message):
+    _write(writer, message)
+    await writer.drain()
+
+
+def parse_address(address, default_host="127.0.0.1"):
+    """Parses 'host:port' or 'port' into a (host, port) tuple."""
+    host, _, port = address.rpartition(":")
+    return host or default_host, int(port)
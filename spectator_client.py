@@ -0,0 +1,90 @@
+import sys
+import argparse
+import json
+import socket
+import threading
+import pygame
+from main import setup_sprites, render_world, handle_pygame_events
+from spectator import parse_address
+
+ACK = b'{"type":"ack"}\n'
+
+class SpectatedWorld:
+    """Mirror of the streamed world state, shaped like `World` for `render_world`."""
+
+    def __init__(self, init_message):
+        self.width = init_message["width"]
+        self.height = init_message["height"]
+        self.tick = init_message["tick"]
+        self.worldmap_buffer = [list(row) for row in init_message["map"]]
+        self.win = None
+        self.lock = threading.Lock()
+
+    def apply(self, message):
+        with self.lock:
+            self.tick = message["tick"]
+            if message["type"] == "delta":
+                for x, y, tile in message["cells"]:
+                    self.worldmap_buffer[y][x] = tile
+            elif message["type"] == "end":
+                self.win = (message["winner"], message["reason"])
+
+def receive_messages(connection, stream, world):
+    """Reads messages from the server until the match ends or the connection closes."""
+    try:
+        for line in stream:
+            message = json.loads(line)
+            world.apply(message)
+            if message["type"] == "end":
+                break
+            connection.sendall(ACK)
+    except OSError:
+        pass
+
+def main(args):
+    host, port = parse_address(args.address)
+    try:
+        connection = socket.create_connection((host, port))
+    except OSError as e:
+        print(f"Could not connect to spectator server at {host}:{port}: {e}")
+        sys.exit(1)
+    stream = connection.makefile("r", encoding="utf-8")
+
+    init_message = json.loads(stream.readline())
+    world = SpectatedWorld(init_message)
+    connection.sendall(ACK)
+    receiver = threading.Thread(target=receive_messages, args=(connection, stream, world), daemon=True)
+    receiver.start()
+
+    pygame.init()
+    screen = pygame.display.set_mode((world.width*32, world.height*32))
+    sprite_group = pygame.sprite.Group()
+    sprites = setup_sprites()
+    clock = pygame.time.Clock()
+
+    running = True
+    while running and world.win is None and receiver.is_alive():
+        with world.lock:
+            pygame.display.set_caption(f"Spectating {host}:{port} - tick {world.tick}")
+            render_world(world, screen, sprite_group, sprites)
+        running = handle_pygame_events()
+        clock.tick(args.fps)
+
+    if world.win:
+        winner, reason = world.win
+        if winner == "tied":
+            print(f"\nTied! Reason: {reason}\n")
+        else:
+            print(f"\n{winner.capitalize()} won! Reason: {reason}\n")
+    elif running:
+        print("\nDisconnected from the spectator server before the match ended.\n")
+
+    connection.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a match streamed by main.py --spectate")
+    parser.add_argument("address", help="Spectator server address, as [HOST:]PORT")
+    parser.add_argument("--fps", type=int, default=30, help="Maximum frames rendered per second")
+    args = parser.parse_args()
+    main(args)
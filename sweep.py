@@ -0,0 +1,202 @@
+"""
+Parameter sweeps over the game settings.
+
+Plays seeded headless matches for every point of a grid (or a random sample of
+it) on all CPU cores, and prints win rate, average match length and timeout
+rate per point:
+
+    python sweep.py my_team other_team --param agent_vision_range=3,4,5 --param shoot_cooldown=2,4,8 --matches 50
+    python sweep.py my_team other_team --param heal_resupply_rate=50,100,200 --param agent_max_ammo=5,10,20 --sample 4
+
+Parameters are the fields of `config.Settings`. Each match's result is cached
+under the settings and teams it was played with as soon as it finishes, so an
+interrupted sweep picks up where it stopped, and extending a sweep only plays
+the new matches.
+"""
+
+import sys
+import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+from tournament import load_agent_class, play_match
+from config import *
+
+_CONSTANTS = {"none": None, "true": True, "false": False}
+
+def parse_value(text):
+    """Parses one setting value: a number, None, True or False."""
+    if text.lower() in _CONSTANTS:
+        return _CONSTANTS[text.lower()]
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid value '{text}', expected a number, None, True or False")
+
+def parse_param(text):
+    """Parses 'name=1,2,None' into (name, [1, 2, None])."""
+    name, _, values = text.partition("=")
+    if name not in Settings.FIELDS:
+        raise argparse.ArgumentTypeError(f"Unknown setting '{name}', expected one of: {', '.join(Settings.FIELDS)}")
+    return name, [parse_value(value) for value in values.split(",")]
+
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"Must be at least 1, got {value}")
+    return value
+
+def sweep_points(params, sample=None, seed=0):
+    """Returns the grid of parameter combinations as dicts, or a random sample of `sample` of them."""
+    names = [name for name, _ in params]
+    points = [dict(zip(names, values)) for values in itertools.product(*(values for _, values in params))]
+    if sample is not None and sample < len(points):
+        points = random.Random(seed).sample(points, sample)
+    return points
+
+def cache_key(settings, blue_team_folder, red_team_folder):
+    """Hash identifying a combination of settings and teams."""
+    description = json.dumps({"settings": settings.as_dict(), "blue": blue_team_folder, "red": red_team_folder},
+                             sort_keys=True)
+    return hashlib.sha1(description.encode()).hexdigest()[:16]
+
+class ResultCache:
+    """Match results on disk, one JSON file per (settings, teams) combination, keyed by seed."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key):
+        try:
+            with open(self._path(key)) as f:
+                return {int(seed): result for seed, result in json.load(f)["matches"].items()}
+        except FileNotFoundError:
+            return {}
+
+    def store(self, key, settings, blue_team_folder, red_team_folder, matches):
+        # Write to a temporary file first, so an interrupted sweep never leaves a broken cache entry
+        path = self._path(key)
+        with open(path + ".tmp", "w") as f:
+            json.dump({
+                "settings": settings.as_dict(),
+                "blue": blue_team_folder,
+                "red": red_team_folder,
+                "matches": matches,
+            }, f)
+        os.replace(path + ".tmp", path)
+
+_agent_classes = {}
+
+def play_sweep_match(blue_team_folder, red_team_folder, settings, seed):
+    """Plays one match in a worker process. Agent classes are loaded once per worker."""
+    for folder in (blue_team_folder, red_team_folder):
+        if folder not in _agent_classes:
+            _agent_classes[folder] = load_agent_class(folder)
+    with contextlib.redirect_stdout(io.StringIO()):
+        world = play_match(_agent_classes[blue_team_folder], _agent_classes[red_team_folder], settings, seed=seed)
+    return {"winner": world.win[0], "reason": world.win[1], "ticks": world.tick, "ticks_saved": world.ticks_saved}
+
+def summarize(point, matches):
+    """Statistics of one sweep point from its match results."""
+    count = len(matches)
+    return {
+        **point,
+        "matches": count,
+        "blue_win_rate": sum(match["winner"] == "blue" for match in matches) / count,
+        "red_win_rate": sum(match["winner"] == "red" for match in matches) / count,
+        "tie_rate": sum(match["winner"] == "tied" for match in matches) / count,
+        "timeout_rate": sum(match["reason"] == "timeout" for match in matches) / count,
+        "average_ticks": sum(match["ticks"] for match in matches) / count,
+        "average_ticks_saved": sum(match.get("ticks_saved", 0) for match in matches) / count,
+    }
+
+def run_sweep(blue_team_folder, red_team_folder, points, base_settings, matches, cache, workers=None):
+    """Plays all missing matches of all points in parallel and returns one summary per point."""
+    seeds = range(matches)
+    point_settings = [base_settings.replace(**point) for point in points]
+    keys = [cache_key(settings, blue_team_folder, red_team_folder) for settings in point_settings]
+    results = [cache.load(key) for key in keys]
+
+    missing = [(i, seed) for i in range(len(points)) for seed in seeds if seed not in results[i]]
+    cached = len(points) * matches - len(missing)
+    print(f"{len(points)} points x {matches} matches: {cached} cached, {len(missing)} to play")
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(play_sweep_match, blue_team_folder, red_team_folder, point_settings[i], seed): (i, seed)
+            for i, seed in missing
+        }
+        for future in concurrent.futures.as_completed(futures):
+            i, seed = futures[future]
+            results[i][seed] = future.result()
+            # Save after every match, so an interrupted sweep loses at most the matches in progress
+            cache.store(keys[i], point_settings[i], blue_team_folder, red_team_folder, results[i])
+
+    return [summarize(point, [results[i][seed] for seed in seeds]) for i, point in enumerate(points)]
+
+def format_table(summaries, names):
+    """Formats sweep summaries as a plain text table, one row per point."""
+    headers = names + ["matches", "blue win%", "red win%", "tie%", "timeout%", "avg ticks", "avg saved"]
+    rows = [headers]
+    for summary in summaries:
+        rows.append([str(summary[name]) for name in names] + [
+            str(summary["matches"]),
+            f"{summary['blue_win_rate']:.1%}",
+            f"{summary['red_win_rate']:.1%}",
+            f"{summary['tie_rate']:.1%}",
+            f"{summary['timeout_rate']:.1%}",
+            f"{summary['average_ticks']:.0f}",
+            f"{summary['average_ticks_saved']:.0f}",
+        ])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(headers))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
+
+def main(args):
+    # Fail early if a team can't be loaded, instead of in every worker
+    try:
+        load_agent_class(args.blue_team_folder)
+        load_agent_class(args.red_team_folder)
+    except (ImportError, AttributeError, FileNotFoundError) as e:
+        print(f"Error loading agent: {e}")
+        sys.exit(1)
+
+    points = sweep_points(args.param, args.sample, args.seed)
+    summaries = run_sweep(args.blue_team_folder, args.red_team_folder, points, Settings(), args.matches,
+                          ResultCache(args.cache), args.workers)
+
+    names = [name for name, _ in args.param]
+    print(format_table(summaries, names))
+
+    if args.csv:
+        with open(args.csv, "w") as f:
+            f.write(",".join(summaries[0].keys()) + "\n")
+            for summary in summaries:
+                f.write(",".join(str(value) for value in summary.values()) + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run parallel parameter sweeps over game settings")
+    parser.add_argument("blue_team_folder", help="Path to the folder containing the blue team's agent.py")
+    parser.add_argument("red_team_folder", help="Path to the folder containing the red team's agent.py")
+    parser.add_argument("--param", "-p", type=parse_param, action="append", required=True, metavar="NAME=V1,V2,...",
+                        help="A setting and the values to try (repeat for more settings)")
+    parser.add_argument("--sample", type=int, help="Play a random sample of this many grid points instead of all")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for sampling grid points")
+    parser.add_argument("--matches", "-n", type=positive_int, default=20, help="Seeded matches per point")
+    parser.add_argument("--workers", "-j", type=int, help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--cache", default=".sweep_cache", help="Directory for cached match results")
+    parser.add_argument("--csv", help="Also write the table to this CSV file")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,212 @@
+"""
+Match telemetry: a stream of game events and per-team statistics built from it.
+
+A `MatchTelemetry` attached to a `World` receives events as they happen:
+
+    match_start  teams playing, map size
+    shot         an agent fired (x, y, direction)
+    hit          a bullet hit an agent (the event's team/agent is the victim,
+                 `shooter` is the shooting team). A bullet hitting several
+                 agents on one tile sends one event per agent, all but the
+                 first marked `same_bullet`
+    kill         an agent died and was removed from the game (`shooter` is the
+                 team that hit it last)
+    flag_pickup  an agent picked up the enemy flag
+    flag_drop    a flag carrier was hit and dropped the flag
+    heal         an agent at its home flag regained hp and/or ammo
+    capture      a flag carrier brought the flag home
+    match_end    winner, reason and length of the match
+
+Events are buffered in memory and written in chunks to a gzipped JSON lines
+file, one event per line. Several matches, and several processes writing
+separate files, can go to the same dataset. Engine code checks
+`world.telemetry` before building an event, so a world without telemetry pays
+nothing.
+
+    python telemetry.py summarize events/*.jsonl.gz
+
+streams over any number of event files in constant memory (only matches still
+in progress keep state) and prints a table of statistics per team.
+"""
+
+import argparse
+import gzip
+import json
+import uuid
+
+
+class MatchTelemetry:
+
+    def __init__(self, path, blue_team="blue", red_team="red", match_id=None, chunk_size=4096):
+        self.path = path
+        self.match_id = match_id or uuid.uuid4().hex[:12]
+        self.chunk_size = chunk_size
+        self._events = []
+        self._file = gzip.open(path, "at")
+        self._blue_team = blue_team
+        self._red_team = red_team
+
+    def start(self, world):
+        """Records the start of a match. Called by the world once it is generated."""
+        self.emit("match_start", world.tick, None, None, None,
+                  blue=self._blue_team, red=self._red_team, width=world.width, height=world.height)
+
+    def emit(self, event, tick, team, agent, position, **extra):
+        x, y = position if position else (None, None)
+        self._events.append((event, tick, team, agent, x, y, extra))
+        if len(self._events) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Writes buffered events as one compressed chunk."""
+        if self._events:
+            events, self._events = self._events, []
+            self._file.writelines(_encode(_records(events, self.match_id)))
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def _records(events, match_id):
+    """Turns buffered event tuples into dicts."""
+    for event, tick, team, agent, x, y, extra in events:
+        record = {"match": match_id, "event": event, "tick": tick}
+        if team is not None:
+            record["team"] = team
+            record["agent"] = agent
+        if x is not None:
+            record["x"] = x
+            record["y"] = y
+        record.update(extra)
+        yield record
+
+
+def _encode(records):
+    for record in records:
+        yield json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def read_events(paths):
+    """Yields the events of one or more telemetry files, one at a time."""
+    for path in paths:
+        with gzip.open(path, "rt") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def _new_team_stats():
+    return {
+        "matches": 0, "wins": 0, "losses": 0, "ties": 0, "ticks": 0,
+        "shots": 0, "hits": 0, "kills": 0, "deaths": 0,
+        "deaths_home": 0, "deaths_middle": 0, "deaths_enemy": 0,
+        "flag_pickups": 0, "flag_drops": 0, "captures": 0,
+        "flag_ticks": 0, "heal_ticks": 0,
+    }
+
+
+def _zone(team, x, width):
+    """Which third of the map a tile is in, from the team's point of view."""
+    third = x * 3 // width
+    if team == "red":
+        third = 2 - third
+    return ("home", "middle", "enemy")[third]
+
+
+def aggregate(events):
+    """
+    Builds per-team statistics from an event stream. Teams are identified by
+    name (the agent folder) when known and by color otherwise. Only matches
+    that haven't ended yet are kept in memory.
+    """
+    stats = {}
+    matches = {} # match id -> {"teams": color -> name, "width": w, "holding": color -> pickup tick}
+
+    for event in events:
+        kind = event["event"]
+        match = matches.get(event["match"])
+
+        if kind == "match_start":
+            matches[event["match"]] = {
+                "teams": {"blue": event["blue"], "red": event["red"]},
+                "width": event["width"],
+                "holding": {},
+            }
+            continue
+        if match is None:
+            continue # Match started in a file that wasn't given
+
+        team = match["teams"].get(event.get("team"))
+        team_stats = stats.setdefault(team, _new_team_stats()) if team else None
+
+        if kind == "shot":
+            team_stats["shots"] += 1
+        elif kind == "hit":
+            # Hits are counted per bullet, so they can be compared to shots
+            if not event.get("same_bullet"):
+                stats.setdefault(match["teams"][event["shooter"]], _new_team_stats())["hits"] += 1
+        elif kind == "kill":
+            stats.setdefault(match["teams"][event["shooter"]], _new_team_stats())["kills"] += 1
+            team_stats["deaths"] += 1
+            team_stats["deaths_" + _zone(event["team"], event["x"], match["width"])] += 1
+        elif kind == "flag_pickup":
+            team_stats["flag_pickups"] += 1
+            match["holding"][event["team"]] = event["tick"]
+        elif kind in ("flag_drop", "capture"):
+            team_stats["flag_drops" if kind == "flag_drop" else "captures"] += 1
+            picked_up = match["holding"].pop(event["team"], None)
+            if picked_up is not None:
+                team_stats["flag_ticks"] += event["tick"] - picked_up
+        elif kind == "heal":
+            team_stats["heal_ticks"] += 1
+        elif kind == "match_end":
+            for color, name in match["teams"].items():
+                result = stats.setdefault(name, _new_team_stats())
+                result["matches"] += 1
+                result["ticks"] += event["tick"]
+                if event["winner"] == "tied":
+                    result["ties"] += 1
+                elif event["winner"] == color:
+                    result["wins"] += 1
+                else:
+                    result["losses"] += 1
+                picked_up = match["holding"].get(color)
+                if picked_up is not None:
+                    result["flag_ticks"] += event["tick"] - picked_up
+            del matches[event["match"]]
+
+    return stats
+
+
+def format_table(stats):
+    """Formats aggregated statistics as a plain text table, one row per team."""
+    columns = [
+        ("team", lambda name, s: name),
+        ("matches", lambda name, s: s["matches"]),
+        ("win%", lambda name, s: f"{s['wins'] / s['matches']:.0%}" if s["matches"] else "-"),
+        ("shots", lambda name, s: s["shots"]),
+        ("hit%", lambda name, s: f"{s['hits'] / s['shots']:.0%}" if s["shots"] else "-"),
+        ("kills", lambda name, s: s["kills"]),
+        ("deaths", lambda name, s: s["deaths"]),
+        ("home/mid/enemy", lambda name, s: f"{s['deaths_home']}/{s['deaths_middle']}/{s['deaths_enemy']}"),
+        ("pickups", lambda name, s: s["flag_pickups"]),
+        ("drops", lambda name, s: s["flag_drops"]),
+        ("captures", lambda name, s: s["captures"]),
+        ("flag%", lambda name, s: f"{s['flag_ticks'] / s['ticks']:.1%}" if s["ticks"] else "-"),
+        ("heals", lambda name, s: s["heal_ticks"]),
+    ]
+    rows = [[header for header, _ in columns]]
+    for name in sorted(stats):
+        rows.append([str(value(name, stats[name])) for _, value in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Match telemetry tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summarize_parser = subparsers.add_parser("summarize", help="Print per-team statistics from telemetry files")
+    summarize_parser.add_argument("paths", nargs="+", help="Telemetry files (.jsonl.gz)")
+    args = parser.parse_args()
+
+    print(format_table(aggregate(read_events(args.paths))))
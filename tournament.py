@@ -1,12 +1,30 @@
+import sys
 import time
 import random
-import copy
 import os
+import inspect
+import functools
+import importlib
+from collections import Counter, deque
 from config import *
+from knowledge import CopyOnWriteKnowledge, measure_size, estimate_size
+from zobrist import ZobristHash, AGENT_POSITION, AGENT_HP, AGENT_AMMO, AGENT_COOLDOWN, FLAG_HOLDER, BULLET, TICK, MAP, COLOR_CODES, MASK
+import zobrist
+
+# Shared direction vectors, so moving and shooting don't allocate new tuples
+DIRECTIONS = {
+    "right": (1, 0),
+    "left": (-1, 0),
+    "up": (0, -1),
+    "down": (0, 1),
+}
 
 class World:
 
-    def __init__(self, height, width, tick_rate, blue_agent_class, red_agent_class, headless=False, ascii_mode=False):
+    def __init__(self, height, width, tick_rate, blue_agent_class, red_agent_class, headless=False, ascii_mode=False, settings=None,
+                 telemetry=None):
+        # Explicit height, width and tick rate take precedence over the settings object.
+        self.settings = (settings or Settings()).replace(height=height, width=width, tick_rate=tick_rate)
         self.height = height
         self.width = width
         self.tick_rate = tick_rate
@@ -14,6 +32,7 @@ class World:
         self.red_agent_class = red_agent_class
         self.headless = headless
         self.ascii_mode = ascii_mode
+        self.telemetry = telemetry # Receives game events if set (see telemetry.py)
         
         self.tick = 0
         self.worldmap = None
@@ -23,9 +42,28 @@ class World:
         self.agents = []
         self.flags = []
         self.bullets = []
+        self._bullet_pool = [] # Destroyed bullets, reused for new shots
+        self.observation_cache = ObservationCache(self)
+        # Hash of the map and all objects' state, updated by every change (see zobrist.py)
+        self.zobrist = ZobristHash()
+        self.map_key = None
+        # Ends hopeless games early, if enabled
+        self.stalemate_detector = StalemateDetector(self) if self.settings.stalemate_agent_ticks else None
+        self.ticks_saved = 0 # Ticks left until the time limit when a stalemate ended the game
         
-        self.blue_shared_knowledge = {}
-        self.red_shared_knowledge = {}
+        if self.settings.shared_knowledge_copy_on_write:
+            self.blue_shared_knowledge = CopyOnWriteKnowledge()
+            self.red_shared_knowledge = CopyOnWriteKnowledge()
+        else:
+            self.blue_shared_knowledge = {}
+            self.red_shared_knowledge = {}
+        # Largest measured size of each team's shared knowledge, in bytes
+        self.shared_knowledge_peak = {"blue": 0, "red": 0} # Largest sampled sizes
+        self.shared_knowledge_over_limit = [] # Teams found over the limit at the end of the game
+        # Own generator for sampling the knowledge, seeded the same in every match, so
+        # measuring never changes the game's random numbers and always samples alike
+        self._knowledge_sampler = random.Random(0)
+        self._agent_updates = 0
     
     def _clear_area(self, x, y):
         for yi in [-1, 0, 1]:
@@ -34,23 +72,23 @@ class World:
     
     def _clear_random_path(self, flag_blue_pos, flag_red_pos):
         position = flag_blue_pos
-        while position[0] < (WIDTH+1)/2:
+        while position[0] < (self.width+1)/2:
             self.worldmap[position[1]][position[0]] = ASCII_TILES["empty"]
             r = random.random()
             if r > 0.75 and position[1] > 3:
                 position = (position[0], position[1]-1)
-            elif r > 0.5 and position[1] < HEIGHT-4:
+            elif r > 0.5 and position[1] < self.height-4:
                 position = (position[0], position[1]+1)
             else:
                 position = (position[0]+1, position[1])
         position_left = position
         position = flag_red_pos
-        while position[0] > (WIDTH-1)/2:
+        while position[0] > (self.width-1)/2:
             self.worldmap[position[1]][position[0]] = ASCII_TILES["empty"]
             r = random.random()
             if r > 0.75 and position[1] > 3:
                 position = (position[0], position[1]-1)
-            elif r > 0.5 and position[1] < HEIGHT-4:
+            elif r > 0.5 and position[1] < self.height-4:
                 position = (position[0], position[1]+1)
             else:
                 position = (position[0]-1, position[1])
@@ -67,7 +105,7 @@ class World:
             do_vertical_line = False
         if do_vertical_line:
             for yi in range(beg_y, end_y):
-                self.worldmap[yi][WIDTH//2] = ASCII_TILES["empty"]
+                self.worldmap[yi][self.width//2] = ASCII_TILES["empty"]
 
     def generate_world(self):
         self.worldmap = [[ASCII_TILES["empty"] for _ in range(self.width)] for _ in range(self.height)]
@@ -79,18 +117,18 @@ class World:
                 if x == 0 or x == self.width-1 or y == 0 or y == self.height-1:
                     self.worldmap[y][x] = ASCII_TILES["wall"]
 
+        AgentEngine.blue_index = 0
+        AgentEngine.red_index = 0
+
         flag_x = random.randint(3, 5)
         flag_y = random.randint(4, self.height - 5)
         flag_blue_pos = (flag_x, flag_y)
         self._clear_area(flag_x, flag_y)
         self.flags.append( Flag("blue", (flag_x, flag_y)) )
 
-        self.agents.append( AgentEngine("blue", (flag_x + 2, flag_y), self.blue_agent_class) )
-        self._clear_area(flag_x + 2, flag_y)
-        self.agents.append( AgentEngine("blue", (flag_x, flag_y + 2), self.blue_agent_class) )
-        self._clear_area(flag_x, flag_y + 2)
-        self.agents.append( AgentEngine("blue", (flag_x, flag_y - 2), self.blue_agent_class) )
-        self._clear_area(flag_x, flag_y - 2)
+        for position in self._spawn_positions(flag_blue_pos, facing=1):
+            self.agents.append( AgentEngine("blue", position, self.blue_agent_class, self.settings, self.zobrist) )
+            self._clear_area(*position)
 
         flag_x = random.randint(self.width - 6, self.width - 4)
         flag_y = random.randint(4, self.height - 5)
@@ -98,17 +136,46 @@ class World:
         self._clear_area(flag_x, flag_y)
         self.flags.append( Flag("red", (flag_x, flag_y)) )
 
-        self.agents.append( AgentEngine("red", (flag_x - 2, flag_y), self.red_agent_class) )
-        self._clear_area(flag_x - 2, flag_y)
-        self.agents.append( AgentEngine("red", (flag_x, flag_y + 2), self.red_agent_class) )
-        self._clear_area(flag_x, flag_y + 2)
-        self.agents.append( AgentEngine("red", (flag_x, flag_y - 2), self.red_agent_class) )
-        self._clear_area(flag_x, flag_y - 2)
+        for position in self._spawn_positions(flag_red_pos, facing=-1):
+            self.agents.append( AgentEngine("red", position, self.red_agent_class, self.settings, self.zobrist) )
+            self._clear_area(*position)
 
         self._clear_random_path(flag_blue_pos, flag_red_pos)
+        self.map_key = zobrist.map_key(self.worldmap)
+        self.zobrist.add((MAP, self.map_key))
+
+        if self.telemetry:
+            self.telemetry.start(self)
+
+    def _spawn_positions(self, flag_pos, facing):
+        """
+        Returns `agents_per_team` spawn positions around a flag. The first three
+        are the classic spots (two tiles in front of, below and above the flag);
+        further agents fill rings of increasing Manhattan distance, nearest first.
+        `facing` is +1 for the team attacking to the right and -1 for the left.
+        """
+        flag_x, flag_y = flag_pos
+        count = self.settings.agents_per_team
+        positions = []
+        offsets = [(2*facing, 0), (0, 2), (0, -2)]
+        distance = 2
+        while len(positions) < count:
+            if distance > self.width + self.height:
+                raise ValueError(f"Map is too small for {count} agents per team")
+            for dx, dy in offsets:
+                x, y = flag_x + dx, flag_y + dy
+                # Keep away from the edge so _clear_area doesn't remove the border walls
+                if 2 <= x <= self.width - 3 and 2 <= y <= self.height - 3 and (x, y) not in positions:
+                    positions.append((x, y))
+                    if len(positions) == count:
+                        break
+            offsets = _ring_offsets(distance, facing)
+            distance += 1
+        return positions
 
     def buffer_worldmap(self):
-        self.worldmap_buffer = copy.deepcopy(self.worldmap)
+        # Tiles are immutable strings, so copying the rows is enough
+        self.worldmap_buffer = [row[:] for row in self.worldmap]
         for obj in self.bullets + self.agents:
             self.worldmap_buffer[obj.position[1]][obj.position[0]] = obj.ascii_tile
         for flag in self.flags:
@@ -122,6 +189,18 @@ class World:
         for row in self.worldmap_buffer:
             print(" " + " ".join(row))
 
+    def step(self):
+        """Advances the simulation by one tick."""
+        self.check_win_state()
+        self.buffer_worldmap()
+
+        if self.tick % self.settings.agent_update_interval == 0:
+            self.update_agents()
+        if (self.tick + 1) % self.settings.bullet_update_interval == 0:
+            self.update_bullets()
+
+        self.iter()
+
     def iter(self):
         # Sleep to control simulation speed for visualization (GUI or ASCII).
         # In pure headless mode (no GUI, no ASCII), run as fast as possible.
@@ -130,17 +209,26 @@ class World:
         self.tick += 1
     
     def update_agents(self):
+        # Find what moved since the previous agent update, so unchanged observations can be reused
+        self.observation_cache.begin_update()
+
         # Agents decide and perform actions
         for agent in self.agents:
             agent.control(self)
         
+        # Keep an eye on how much the teams store in their shared knowledge
+        self._agent_updates += 1
+        interval = self.settings.shared_knowledge_sample_interval
+        if interval and self._agent_updates % interval == 0:
+            self.check_shared_knowledge()
+
         # Agents handle collisions with walls/flags and update their cooldowns
         for agent in self.agents:
             agent.collision(self)
             agent.update_can_shoot()
 
         # Agents heal and resupply if near their home flag spawn point
-        if self.tick % HEAL_RESUPPLY_RATE == 0:
+        if self.tick % self.settings.heal_resupply_rate == 0:
             for agent in self.agents:
                 agent.heal_and_resupply(self)
 
@@ -149,14 +237,98 @@ class World:
             agent = self.agents[i]
             if agent.hp <= 0:
                 agent.terminate(reason = "died")
+                if self.telemetry:
+                    self.telemetry.emit("kill", self.tick, agent.color, agent.index, agent.position, shooter=agent.last_hit_by)
+                for feature in agent.hash_features():
+                    self.zobrist.remove(feature)
                 del self.agents[i]
     
+    def spawn_bullet(self, agent, direction):
+        """Fires a bullet from the agent's position, reusing a destroyed bullet if there is one."""
+        if self._bullet_pool:
+            bullet = self._bullet_pool.pop()
+            bullet.reset(agent, direction)
+        else:
+            bullet = Bullet(agent, direction)
+        self.bullets.append(bullet)
+        self.zobrist.add(bullet.hash_feature())
+
+    def check_shared_knowledge(self):
+        """
+        Estimates the size of both teams' shared knowledge from a sample of it and
+        records the peak sizes. A team over `shared_knowledge_limit` forfeits the
+        game; if both are over, it's a tie.
+        """
+        knowledge = {"blue": self.blue_shared_knowledge, "red": self.red_shared_knowledge}
+        sizes = {color: estimate_size(knowledge[color], self._knowledge_sampler) for color in knowledge}
+
+        limit = self.settings.shared_knowledge_limit
+        if limit is not None:
+            for color, size in sizes.items():
+                # Only forfeit a team once a full measurement confirms the estimate
+                if size > limit:
+                    sizes[color] = measure_size(knowledge[color], limit)
+
+        for color, size in sizes.items():
+            self.shared_knowledge_peak[color] = max(self.shared_knowledge_peak[color], size)
+
+        if limit is None or self.win:
+            return
+        blue_over, red_over = sizes["blue"] > limit, sizes["red"] > limit
+        if blue_over and red_over:
+            self.win = ("tied", "shared_knowledge_limit")
+        elif blue_over:
+            self.win = ("red", "shared_knowledge_limit")
+        elif red_over:
+            self.win = ("blue", "shared_knowledge_limit")
+
+    def check_final_shared_knowledge(self):
+        """
+        Measures both teams' shared knowledge in full, up to `shared_knowledge_limit`,
+        and records the teams over it in `shared_knowledge_over_limit`. This catches
+        large entries the samples missed, without changing the result of the game.
+        """
+        limit = self.settings.shared_knowledge_limit
+        if limit is None:
+            return
+        for color, knowledge in (("blue", self.blue_shared_knowledge), ("red", self.red_shared_knowledge)):
+            if measure_size(knowledge, limit) > limit:
+                self.shared_knowledge_over_limit.append(color)
+
     def update_bullets(self):
         for i in range(len(self.bullets)-1, -1, -1):
-            hit = self.bullets[i].update(self.worldmap_buffer, self.agents)
+            bullet = self.bullets[i]
+            hit = bullet.update(self)
             if hit:
+                self.zobrist.remove(bullet.hash_feature())
                 del self.bullets[i]
+                self._bullet_pool.append(bullet)
     
+    @property
+    def position_hash(self):
+        """
+        64-bit hash of the map and all object state (positions, hp, ammo, shooting
+        cooldowns, flag holders, bullets), without the tick. The agents' own memory,
+        their shared knowledge and the random number generator aren't included.
+        """
+        return self.zobrist.value
+
+    @property
+    def state_hash(self):
+        """64-bit hash of the full simulation state, including the tick."""
+        return (self.zobrist.value + zobrist.key((TICK, self.tick))) & MASK
+
+    def compute_state_hash(self):
+        """Hashes the state from scratch. Should always equal `state_hash`."""
+        features = [(TICK, self.tick), (MAP, self.map_key)]
+        for agent in self.agents:
+            features.extend(agent.hash_features())
+        for flag in self.flags:
+            features.extend(flag.hash_features())
+        for bullet in self.bullets:
+            features.append(bullet.hash_feature())
+        return zobrist.hash_features(features)
+
     def check_win_state(self):
         if self.win: return
         blue_count = 0
@@ -173,15 +345,268 @@ class World:
             self.win = ("blue", "elimination")
         elif blue_count == 0:
             self.win = ("red", "elimination")
-        elif self.tick >= MAX_TICKS:
+        elif self.tick >= self.settings.max_ticks:
             self.win = ("tied", "timeout")
+        elif self.stalemate_detector and self.tick % self.settings.agent_update_interval == 0:
+            if self.stalemate_detector.check():
+                self.win = ("tied", "stalemate")
+                self.ticks_saved = self.settings.max_ticks - self.tick
     
     def terminate_agents(self):
+        self.check_final_shared_knowledge()
+
         for agent in self.agents:
             agent.terminate(reason = self.win[0])
 
+        if self.telemetry:
+            self.telemetry.emit("match_end", self.tick, None, None, None, winner=self.win[0], reason=self.win[1])
+            self.telemetry.flush()
+
+
+def load_agent_class(folder_path):
+    """Dynamically loads the Agent class from the 'agent.py' file within a given folder."""
+    if not os.path.isdir(folder_path):
+        raise FileNotFoundError(f"Agent folder not found: {folder_path}")
+    
+    main_agent_file = os.path.join(folder_path, 'agent.py')
+    if not os.path.isfile(main_agent_file):
+        raise FileNotFoundError(f"Required 'agent.py' not found in folder: {folder_path}")
+
+    # Temporarily add folder to Python path to handle local imports within the agent code
+    sys.path.insert(0, os.path.abspath(folder_path))
+    try:
+        # The module name is 'agent' because the file is agent.py
+        agent_module = importlib.import_module('agent')
+        # Ensure the module is fresh if it was loaded before
+        importlib.reload(agent_module) 
+        agent_class = agent_module.Agent
+    finally:
+        # Clean up the path
+        sys.path.pop(0)
+    
+    return agent_class
+
+
+def play_match(blue_agent_class, red_agent_class, settings=None, seed=None, on_tick=None, telemetry=None):
+    """
+    Plays a full headless match and returns the finished World.
+    `on_tick`, if given, is called with the world after it is generated and after every tick.
+    """
+    if seed is not None:
+        random.seed(seed)
+    settings = settings or Settings()
+    world = World(settings.height, settings.width, settings.tick_rate, blue_agent_class, red_agent_class,
+                  headless=True, settings=settings, telemetry=telemetry)
+    world.generate_world()
+    if on_tick:
+        on_tick(world)
+    while not world.win:
+        world.step()
+        if on_tick:
+            on_tick(world)
+    world.terminate_agents()
+    return world
+
+
+class ObservationCache:
+    """
+    Reuses agents' observations between agent updates.
+
+    Walls never change and no object can stand on a wall, so what an agent can
+    see from a tile depends only on that tile. If an agent hasn't moved, its
+    previous observation is still right except for the cells where objects
+    changed. Those cells are taken from the current buffer, and tiles hidden
+    behind walls stay hidden. If nothing changed within the agent's vision, the
+    observation is reused as it is.
+
+    The cache holds one observation per living agent, so its size is bounded by
+    the team sizes. Agents always get their own copy of the rows, because they
+    are free to modify what they receive.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self.hits = 0    # Reused as is
+        self.patched = 0 # Reused with some cells updated
+        self.misses = 0  # Computed from scratch
+
+        self._entries = {}        # agent -> (position, observation)
+        self._objects = None      # (x, y) -> tile of every object in the last update
+        self._changed = {}        # (bucket x, bucket y) -> changed (x, y) cells in that bucket
+        self._bucket_size = world.settings.agent_vision_range*2+1
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.patched + self.misses
+        return (self.hits + self.patched) / total if total else 0.0
+
+    def begin_update(self):
+        """Records which cells changed since the previous agent update. Call before agents observe."""
+        world = self.world
+        # Same drawing order as World.buffer_worldmap, so overlapping objects resolve the same way
+        objects = {}
+        for obj in world.bullets + world.agents:
+            objects[obj.position] = obj.ascii_tile
+        for flag in world.flags:
+            if not flag.agent_holding:
+                objects[flag.position] = flag.ascii_tile
+
+        self._changed = {}
+        if self._objects is None:
+            # Nothing to compare with, every agent will compute its observation
+            self._entries = {}
+        else:
+            previous = self._objects
+            size = self._bucket_size
+            for position in previous.keys() | objects.keys():
+                if previous.get(position) != objects.get(position):
+                    bucket = (position[0] // size, position[1] // size)
+                    self._changed.setdefault(bucket, []).append(position)
+            # Forget agents that died
+            living = set(world.agents)
+            for agent in [agent for agent in self._entries if agent not in living]:
+                del self._entries[agent]
+        self._objects = objects
+
+    def observe(self, agent):
+        """Returns the agent's visible world, reusing its previous observation when possible."""
+        entry = self._entries.get(agent)
+        if entry is None or entry[0] != agent.position:
+            observation = agent.get_visible_world(self.world)
+            self._entries[agent] = (agent.position, observation)
+            self.misses += 1
+            return [row[:] for row in observation]
+
+        observation = entry[1]
+        changed = self._changed_cells_near(agent.position)
+        if changed:
+            vision_range = agent.settings.agent_vision_range
+            left, top = agent.position[0] - vision_range, agent.position[1] - vision_range
+            unknown = ASCII_TILES["unknown"]
+            buffer = self.world.worldmap_buffer
+            for x, y in changed:
+                # Tiles behind walls stay hidden whatever moves there
+                if observation[y - top][x - left] != unknown:
+                    observation[y - top][x - left] = buffer[y][x]
+            self.patched += 1
+        else:
+            self.hits += 1
+        return [row[:] for row in observation]
+
+    def _changed_cells_near(self, position):
+        """Changed cells within vision range of a position."""
+        if not self._changed:
+            return []
+        vision_range = self._bucket_size // 2
+        x, y = position
+        x_min, x_max, y_min, y_max = x - vision_range, x + vision_range, y - vision_range, y + vision_range
+        size = self._bucket_size
+        cells = []
+        for bucket_y in range(y_min // size, y_max // size + 1):
+            for bucket_x in range(x_min // size, x_max // size + 1):
+                for cell in self._changed.get((bucket_x, bucket_y), ()):
+                    if x_min <= cell[0] <= x_max and y_min <= cell[1] <= y_max:
+                        cells.append(cell)
+        return cells
+
+
+class StalemateDetector:
+    """
+    Detects games that can't produce a result before the time limit.
+
+    Called once per agent tick, it reports a stalemate when either:
+    - no new state has appeared for `stalemate_agent_ticks` agent ticks. States
+      are compared by the world's position hash (positions, hp, ammo, flag
+      holders and bullets), and a state counts as new if it wasn't seen within
+      that many agent ticks. This covers both standing still and cycling
+      through the same few states;
+    - no team can capture the enemy flag (or bring a carried flag home) and no
+      two enemies can reach each other. Walls never change, so this is checked
+      on the connected areas of open tiles, computed once per game.
+    `cause` tells which of the two ended the game.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self.window = world.settings.stalemate_agent_ticks
+        self.cause = None
+
+        self._recent = deque()  # Position hashes of the last `window` agent ticks
+        self._counts = Counter()
+        self._agent_ticks = 0
+        self._last_new_state = 0
+        self._areas = None      # Grid of connected area ids, None for walls
+
+    def check(self):
+        """Records the current state. Returns True if the game is in a stalemate."""
+        state = self.world.position_hash
+        self._agent_ticks += 1
+        if self._counts[state] == 0:
+            self._last_new_state = self._agent_ticks
+        self._recent.append(state)
+        self._counts[state] += 1
+        if len(self._recent) > self.window:
+            old = self._recent.popleft()
+            self._counts[old] -= 1
+            if self._counts[old] == 0:
+                del self._counts[old]
+
+        if self._agent_ticks - self._last_new_state >= self.window:
+            self.cause = "no_new_states"
+        elif not self._progress_possible():
+            self.cause = "unreachable"
+        return self.cause is not None
+
+    def _progress_possible(self):
+        world = self.world
+        if self._areas is None:
+            self._areas = _connected_areas(world.worldmap)
+        areas = self._areas
+
+        blue_flag, red_flag = world.flags
+        team_areas = {"blue": set(), "red": set()}
+        for agent in world.agents:
+            area = areas[agent.position[1]][agent.position[0]]
+            team_areas[agent.color].add(area)
+            # A carrier can still win by bringing the flag home
+            home_flag = blue_flag if agent.color == "blue" else red_flag
+            if agent.holding_flag and area == areas[home_flag.position[1]][home_flag.position[0]]:
+                return True
+
+        # Someone can still reach the enemy flag
+        if not red_flag.agent_holding and areas[red_flag.position[1]][red_flag.position[0]] in team_areas["blue"]:
+            return True
+        if not blue_flag.agent_holding and areas[blue_flag.position[1]][blue_flag.position[0]] in team_areas["red"]:
+            return True
+        # Enemies that share an area can still eliminate each other
+        return bool(team_areas["blue"] & team_areas["red"])
+
+
+def _connected_areas(worldmap):
+    """Labels each open tile with the id of its 4-connected area. Walls get None."""
+    wall = ASCII_TILES["wall"]
+    height, width = len(worldmap), len(worldmap[0])
+    areas = [[None] * width for _ in range(height)]
+    next_area = 0
+    for start_y in range(height):
+        for start_x in range(width):
+            if areas[start_y][start_x] is not None or worldmap[start_y][start_x] == wall:
+                continue
+            areas[start_y][start_x] = next_area
+            stack = [(start_x, start_y)]
+            while stack:
+                x, y = stack.pop()
+                for nx, ny in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+                    if 0 <= nx < width and 0 <= ny < height and areas[ny][nx] is None and worldmap[ny][nx] != wall:
+                        areas[ny][nx] = next_area
+                        stack.append((nx, ny))
+            next_area += 1
+    return areas
+
 
 class Flag:
+    __slots__ = ("color", "spawn_position", "position", "agent_holding", "ascii_tile")
+
     def __init__(self, color, position):
         self.color = color
         # The original spawn position of the flag, used for healing/resupply zones.
@@ -194,32 +619,84 @@ class Flag:
         elif self.color == "red":
             self.ascii_tile = ASCII_TILES["red_flag"]
 
+    def holder_feature(self, agent):
+        return (FLAG_HOLDER, COLOR_CODES[self.color], COLOR_CODES[agent.color], agent.index)
+
+    def hash_features(self):
+        if self.agent_holding:
+            return [self.holder_feature(self.agent_holding)]
+        return []
+
 
 class Bullet:
+    __slots__ = ("color", "direction", "position")
+    ascii_tile = ASCII_TILES["bullet"]
+
     def __init__(self, agent, direction):
+        self.reset(agent, direction)
+
+    def reset(self, agent, direction):
+        """(Re)initializes the bullet as if it was just fired by the agent."""
         self.color = agent.color
         self.direction = direction
         self.position = agent.position
-        self.ascii_tile = ASCII_TILES["bullet"]
     
-    def update(self, worldmap_buffer, agents):
+    def hash_feature(self):
+        return (BULLET, COLOR_CODES[self.color], self.position[0], self.position[1], self.direction[0], self.direction[1])
+
+    def update(self, world):
         # Move the bullet one step
+        old_feature = self.hash_feature()
         self.position = (self.position[0] + self.direction[0], self.position[1] + self.direction[1])
+        world.zobrist.replace(old_feature, self.hash_feature())
         
         hit_confirmed = False
         # Check for collision with any enemy agents at the new position
-        for agent in agents:
+        for agent in world.agents:
             if agent.position == self.position and agent.color != self.color:
+                carried_flag = agent.holding_flag
                 agent.take_damage(1)
+                agent.last_hit_by = self.color
+
+                if world.telemetry:
+                    if hit_confirmed: # Another agent on the tile was already hit by this bullet
+                        world.telemetry.emit("hit", world.tick, agent.color, agent.index, self.position,
+                                             shooter=self.color, same_bullet=True)
+                    else:
+                        world.telemetry.emit("hit", world.tick, agent.color, agent.index, self.position, shooter=self.color)
+                    if carried_flag:
+                        world.telemetry.emit("flag_drop", world.tick, agent.color, agent.index, self.position)
                 hit_confirmed = True
                 
         # Check for collision with a wall
-        tile = worldmap_buffer[self.position[1]][self.position[0]]
+        tile = world.worldmap_buffer[self.position[1]][self.position[0]]
         if tile == ASCII_TILES["wall"]:
             return True # Hit a wall, bullet is destroyed
             
         return hit_confirmed # Destroy bullet if it hit any agent(s)
 
+def _ring_offsets(distance, facing):
+    """Offsets at a given Manhattan distance, those towards the enemy side first."""
+    offsets = []
+    for dx in range(-distance, distance + 1):
+        dy = distance - abs(dx)
+        offsets.append((dx, dy))
+        if dy:
+            offsets.append((dx, -dy))
+    offsets.sort(key=lambda offset: (-offset[0]*facing, abs(offset[1])))
+    return offsets
+
+@functools.lru_cache(maxsize=None)
+def _sight_lines(vision_range):
+    """
+    Lines of sight from the center of the vision grid to every tile in it, as
+    (x, y, tiles between), in row-major order. They only depend on the vision
+    range, so they are computed once instead of on every agent update.
+    """
+    center = vision_range
+    size = vision_range*2+1
+    return [(x, y, tuple(_bresenham_line(center, center, x, y))) for y in range(size) for x in range(size)]
+
 def _bresenham_line(x1, y1, x2, y2):
     """Yields coordinates of tiles between two locations (line of sight)."""
     dx = abs(x2 - x1)
@@ -241,21 +718,28 @@ def _bresenham_line(x1, y1, x2, y2):
             y1 += sy
 
 class AgentEngine:
+    __slots__ = (
+        "color", "position", "prev_position", "settings",
+        "hp", "ammo", "can_shoot", "can_shoot_countdown",
+        "holding_flag", "index", "ascii_tile", "agent", "zobrist", "last_hit_by",
+    )
     blue_index = 0
     red_index = 0
 
-    def __init__(self, color, position, agent_class):
+    def __init__(self, color, position, agent_class, settings=None, state_hash=None):
         self.color = color
         self.position = position
         self.prev_position = self.position
+        self.settings = settings or Settings()
         
-        self.hp = AGENT_MAX_HP
-        self.ammo = AGENT_MAX_AMMO
+        self.hp = self.settings.agent_max_hp
+        self.ammo = self.settings.agent_max_ammo
         
         self.can_shoot = True
         self.can_shoot_countdown = 0
         
         self.holding_flag = None
+        self.last_hit_by = None # Color of the team whose bullet hit this agent last
 
         if self.color == "blue":
             self.index = AgentEngine.blue_index
@@ -266,21 +750,66 @@ class AgentEngine:
             AgentEngine.red_index += 1
             self.ascii_tile = ASCII_TILES["red_agent"]
         
-        self.agent = agent_class(self.color, self.index)
+        # Agents that accept a `settings` argument get the match settings
+        if "settings" in inspect.signature(agent_class).parameters:
+            self.agent = agent_class(self.color, self.index, settings=self.settings)
+        else:
+            self.agent = agent_class(self.color, self.index)
+
+        # The world's state hash, kept up to date as this agent changes
+        self.zobrist = state_hash if state_hash is not None else ZobristHash()
+        for feature in self.hash_features():
+            self.zobrist.add(feature)
+
+    def hash_features(self):
+        color_code = COLOR_CODES[self.color]
+        return [
+            (AGENT_POSITION, color_code, self.index, self.position[0], self.position[1]),
+            (AGENT_HP, color_code, self.index, self.hp),
+            (AGENT_AMMO, color_code, self.index, self.ammo),
+            (AGENT_COOLDOWN, color_code, self.index, self.can_shoot, self.can_shoot_countdown),
+        ]
+
+    def _set_position(self, position):
+        color_code = COLOR_CODES[self.color]
+        self.zobrist.replace((AGENT_POSITION, color_code, self.index, self.position[0], self.position[1]),
+                             (AGENT_POSITION, color_code, self.index, position[0], position[1]))
+        self.position = position
+
+    def _set_hp(self, hp):
+        color_code = COLOR_CODES[self.color]
+        self.zobrist.replace((AGENT_HP, color_code, self.index, self.hp), (AGENT_HP, color_code, self.index, hp))
+        self.hp = hp
+
+    def _set_ammo(self, ammo):
+        color_code = COLOR_CODES[self.color]
+        self.zobrist.replace((AGENT_AMMO, color_code, self.index, self.ammo), (AGENT_AMMO, color_code, self.index, ammo))
+        self.ammo = ammo
+
+    def _set_cooldown(self, can_shoot, countdown):
+        color_code = COLOR_CODES[self.color]
+        self.zobrist.replace((AGENT_COOLDOWN, color_code, self.index, self.can_shoot, self.can_shoot_countdown),
+                             (AGENT_COOLDOWN, color_code, self.index, can_shoot, countdown))
+        self.can_shoot = can_shoot
+        self.can_shoot_countdown = countdown
+
+    def _release_flag(self):
+        self.zobrist.remove(self.holding_flag.holder_feature(self))
+        self.holding_flag.agent_holding = None
             
     def terminate(self, reason):
         if self.holding_flag:
-            self.holding_flag.agent_holding = None
+            self._release_flag()
         self.agent.terminate(reason)
     
     def take_damage(self, amount):
         """Reduces the agent's health. If holding a flag, drops it."""
-        self.hp -= amount
+        self._set_hp(self.hp - amount)
 
         if self.holding_flag:
             # Reset the flag's state, returning it to its spawn
             self.holding_flag.position = self.holding_flag.spawn_position
-            self.holding_flag.agent_holding = None
+            self._release_flag()
             
             # Reset the agent's state
             self.holding_flag = None
@@ -297,60 +826,66 @@ class AgentEngine:
         # Calculate Manhattan distance to the flag's spawn point
         distance = abs(self.position[0] - flag_pos[0]) + abs(self.position[1] - flag_pos[1])
         
-        if distance <= HEAL_RESUPPLY_RANGE:
+        if distance <= self.settings.heal_resupply_range:
+            healed = self.hp < self.settings.agent_max_hp
+            resupplied = self.ammo < self.settings.agent_max_ammo
             # Heal one HP if not at max
-            if self.hp < AGENT_MAX_HP:
-                self.hp += 1
+            if healed:
+                self._set_hp(self.hp + 1)
             # Restore one ammo if not at max
-            if self.ammo < AGENT_MAX_AMMO:
-                self.ammo += 1
+            if resupplied:
+                self._set_ammo(self.ammo + 1)
+
+            if world.telemetry and (healed or resupplied):
+                world.telemetry.emit("heal", world.tick, self.color, self.index, self.position, hp=healed, ammo=resupplied)
 
     def get_visible_world(self, world):
+        vision_range = self.settings.agent_vision_range
+        size = vision_range*2+1
+        unknown = ASCII_TILES["unknown"]
+        x_left = self.position[0] - vision_range
         visible_world = []
         
-        for y in range(0, AGENT_VISION_RANGE*2+1):
-            y_world = self.position[1] + y - AGENT_VISION_RANGE
-            visible_world.append([])
-            for x in range(0, AGENT_VISION_RANGE*2+1):
-                x_world = self.position[0] + x - AGENT_VISION_RANGE
-                if 0 <= x_world < world.width and 0 <= y_world < world.height:
-                    visible_world[-1].append(world.worldmap_buffer[y_world][x_world])
-                else:
-                    visible_world[-1].append(ASCII_TILES["unknown"])
+        for y_world in range(self.position[1] - vision_range, self.position[1] + vision_range + 1):
+            if not 0 <= y_world < world.height:
+                visible_world.append([unknown] * size)
+                continue
+            row = world.worldmap_buffer[y_world]
+            if 0 <= x_left and x_left + size <= world.width:
+                visible_world.append(row[x_left:x_left + size])
+            else:
+                visible_world.append([row[x] if 0 <= x < world.width else unknown for x in range(x_left, x_left + size)])
                     
-        agent_x, agent_y = AGENT_VISION_RANGE, AGENT_VISION_RANGE
-        for y in range(len(visible_world)):
-            for x in range(len(visible_world[0])):
-                for x_online, y_online in _bresenham_line(agent_x, agent_y, x, y):
-                    if visible_world[y_online][x_online] == ASCII_TILES["wall"]:
-                        visible_world[y][x] = ASCII_TILES["unknown"]
-                        break
+        wall = ASCII_TILES["wall"]
+        for x, y, line in _sight_lines(vision_range):
+            for x_online, y_online in line:
+                if visible_world[y_online][x_online] == wall:
+                    visible_world[y][x] = unknown
+                    break
         return visible_world
     
     def _handle_movement(self, direction):
         self.prev_position = self.position
-        x, y = self.position
-        if   direction == "right": self.position = (x+1, y)
-        elif direction == "left":  self.position = (x-1, y)
-        elif direction == "up":    self.position = (x, y-1)
-        elif direction == "down":  self.position = (x, y+1)
-        self.can_shoot = False
-        self.can_shoot_countdown = SHOOT_COOLDOWN
+        vector = DIRECTIONS.get(direction)
+        if vector:
+            x, y = self.position
+            self._set_position((x + vector[0], y + vector[1]))
+        self._set_cooldown(False, self.settings.shoot_cooldown)
 
     def _handle_shooting(self, world, direction):
-        if   direction == "right": world.bullets.append( Bullet(self, direction=(1, 0)) )
-        elif direction == "left":  world.bullets.append( Bullet(self, direction=(-1, 0)) )
-        elif direction == "up":    world.bullets.append( Bullet(self, direction=(0, -1)) )
-        elif direction == "down":  world.bullets.append( Bullet(self, direction=(0, 1)) )
-        self.ammo -= 1
-        self.can_shoot = False
-        self.can_shoot_countdown = SHOOT_COOLDOWN
+        vector = DIRECTIONS.get(direction)
+        if vector:
+            world.spawn_bullet(self, vector)
+            if world.telemetry:
+                world.telemetry.emit("shot", world.tick, self.color, self.index, self.position, direction=direction)
+        self._set_ammo(self.ammo - 1)
+        self._set_cooldown(False, self.settings.shoot_cooldown)
 
     def control(self, world):
         knowledge_base = world.blue_shared_knowledge if self.color == "blue" else world.red_shared_knowledge
         
         action, direction = self.agent.update(
-            self.get_visible_world(world),
+            world.observation_cache.observe(self),
             self.position,
             self.can_shoot,
             self.holding_flag,
@@ -367,7 +902,7 @@ class AgentEngine:
     def _check_wall_collision(self, world):
         x, y = self.position
         if world.worldmap[y][x] == ASCII_TILES["wall"]:
-            self.position = self.prev_position
+            self._set_position(self.prev_position)
             return True
         return False
 
@@ -386,14 +921,19 @@ class AgentEngine:
         if world.worldmap_buffer[y][x] == enemy_flag_tile and not enemy_flag_obj.agent_holding:
             self.holding_flag = enemy_flag_obj
             enemy_flag_obj.agent_holding = self
+            self.zobrist.add(enemy_flag_obj.holder_feature(self))
             self.ascii_tile = ASCII_TILES["blue_agent_f"] if self.color == "blue" else ASCII_TILES["red_agent_f"]
+            if world.telemetry:
+                world.telemetry.emit("flag_pickup", world.tick, self.color, self.index, self.position)
         
         # Interact with friendly flag
         elif world.worldmap_buffer[y][x] == friendly_flag_tile:
             if self.holding_flag:
                 world.win = (self.color, "flag_capture")
+                if world.telemetry:
+                    world.telemetry.emit("capture", world.tick, self.color, self.index, self.position)
             else: # collision
-                self.position = self.prev_position
+                self._set_position(self.prev_position)
 
     def collision(self, world):
         if self._check_wall_collision(world):
@@ -402,6 +942,6 @@ class AgentEngine:
 
     def update_can_shoot(self):
         if not self.can_shoot and self.can_shoot_countdown > 0:
-            self.can_shoot_countdown -= 1
-        else:
-            self.can_shoot = True
\ No newline at end of file
+            self._set_cooldown(False, self.can_shoot_countdown - 1)
+        elif not self.can_shoot:
+            self._set_cooldown(True, self.can_shoot_countdown)
\ No newline at end of file
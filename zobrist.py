@@ -0,0 +1,88 @@
+"""
+Incremental 64-bit Zobrist-style hashing of the simulation state.
+
+Every piece of state is a feature, a tuple of small integers such as
+(AGENT_HP, color, index, hp). Each feature maps to a pseudo-random 64-bit key,
+and the hash of a state is the sum of the keys of its features modulo 2**64.
+Changing one piece of state means removing the old feature's key and adding the
+new one, so the engine can keep the hash up to date in constant time per change.
+Keys are summed rather than XORed, so two identical bullets on the same tile
+don't cancel out.
+
+Keys are derived from the feature values alone (no random seed and no Python
+`hash()`, which changes between processes). So different processes and
+different engine versions produce the same hash for the same state.
+"""
+
+import hashlib
+
+MASK = (1 << 64) - 1
+
+# Feature kinds
+AGENT_POSITION = 1 # (kind, color, index, x, y)
+AGENT_HP = 2       # (kind, color, index, hp)
+AGENT_AMMO = 3     # (kind, color, index, ammo)
+FLAG_HOLDER = 4    # (kind, flag color, holder color, holder index)
+BULLET = 5         # (kind, color, x, y, dx, dy)
+TICK = 6           # (kind, tick)
+AGENT_COOLDOWN = 7 # (kind, color, index, can shoot, countdown)
+MAP = 8            # (kind, map key)
+
+COLOR_CODES = {"blue": 0, "red": 1}
+
+_MAX_CACHED_KEYS = 1 << 20
+_keys = {}
+
+
+def _mix64(z):
+    """splitmix64 finalizer: a fast 64-bit mixing function with good avalanche."""
+    z = (z + 0x9E3779B97F4A7C15) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+
+def map_key(worldmap):
+    """64-bit key of a map's layout, so equal object states on different maps hash differently."""
+    digest = hashlib.blake2b("\n".join("".join(row) for row in worldmap).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def key(feature):
+    """Returns the 64-bit key of a feature tuple."""
+    k = _keys.get(feature)
+    if k is None:
+        k = 0
+        for part in feature:
+            k = _mix64(k ^ (part & MASK))
+        if len(_keys) >= _MAX_CACHED_KEYS:
+            _keys.clear()
+        _keys[feature] = k
+    return k
+
+
+class ZobristHash:
+    """The running hash of a set (or multiset) of features."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def add(self, feature):
+        self.value = (self.value + key(feature)) & MASK
+
+    def remove(self, feature):
+        self.value = (self.value - key(feature)) & MASK
+
+    def replace(self, old_feature, new_feature):
+        if old_feature != new_feature:
+            self.value = (self.value - key(old_feature) + key(new_feature)) & MASK
+
+
+def hash_features(features):
+    """Hashes a collection of features from scratch, for checking the incremental hash."""
+    value = 0
+    for feature in features:
+        value = (value + key(feature)) & MASK
+    return value